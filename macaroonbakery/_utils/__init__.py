@@ -12,7 +12,16 @@ from pymacaroons import Macaroon
 from pymacaroons.serializers import json_serializer
 
 import six.moves.http_cookiejar as http_cookiejar
-from six.moves.urllib.parse import urlparse
+from six.moves.urllib.parse import urljoin, urlparse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# _json_serializer is shared by the helpers below; pymacaroons
+# serializers hold no state.
+_json_serializer = json_serializer.JsonSerializer()
 
 
 def to_bytes(s):
@@ -27,6 +36,20 @@ def to_bytes(s):
     raise TypeError('want string or bytes, got {}', type(s))
 
 
+def json_loads(s):
+    '''Decode a JSON document, using orjson when it is available.
+
+    @param s the JSON document {str or bytes}
+    @return the decoded object.
+    @raises ValueError if s is not valid JSON.
+    '''
+    if orjson is not None:
+        return orjson.loads(s)
+    if isinstance(s, six.binary_type):
+        s = s.decode('utf-8')
+    return json.loads(s)
+
+
 def macaroon_from_dict(json_macaroon):
     '''Return a pymacaroons.Macaroon object from the given
     JSON-deserialized dict.
@@ -34,15 +57,14 @@ def macaroon_from_dict(json_macaroon):
     @param JSON-encoded macaroon as dict
     @return the deserialized macaroon object.
     '''
-    return Macaroon.deserialize(json.dumps(json_macaroon),
-                                json_serializer.JsonSerializer())
+    return Macaroon.deserialize(json.dumps(json_macaroon), _json_serializer)
 
 
 def macaroon_to_dict(macaroon):
     '''Turn macaroon into JSON-serializable dict object
     @param pymacaroons.Macaroon.
     '''
-    return json.loads(macaroon.serialize(json_serializer.JsonSerializer()))
+    return json_loads(macaroon.serialize(_json_serializer))
 
 
 def macaroon_to_json_string(macaroon):
@@ -51,7 +73,7 @@ def macaroon_to_json_string(macaroon):
     @param macaroon object to be serialized.
     @return a string serialization form of the macaroon.
     '''
-    return macaroon.serialize(json_serializer.JsonSerializer())
+    return macaroon.serialize(_json_serializer)
 
 
 def _add_base64_padding(b):
@@ -90,10 +112,9 @@ def b64decode(s):
     if not s.endswith(b'='):
         s = s + b'=' * (-len(s) % 4)
     try:
-        if '_' or '-' in s:
-            return base64.urlsafe_b64decode(s)
-        else:
-            return base64.b64decode(s)
+        # urlsafe_b64decode only maps the URL-safe characters onto the
+        # standard ones, so it decodes the standard format too.
+        return base64.urlsafe_b64decode(s)
     except (TypeError, binascii.Error) as e:
         raise ValueError(str(e))
 
@@ -105,11 +126,27 @@ def raw_urlsafe_b64encode(b):
     @return bytes decoded
     '''
     b = to_bytes(b)
+    # The amount of padding follows from the input length.
+    pad = -len(b) % 3
     b = base64.urlsafe_b64encode(b)
-    b = b.rstrip(b'=')  # strip padding
+    if pad:
+        b = b[:-pad]  # strip padding
     return b
 
 
+def relative_url(base, new):
+    '''Return the URL new resolved relative to base, treating base
+    as a directory even when it has no trailing slash.
+
+    @param base the base URL {str}
+    @param new the URL to resolve, usually a relative path {str}
+    @return the resolved URL {str}
+    '''
+    if not base.endswith('/'):
+        base += '/'
+    return urljoin(base, new)
+
+
 def visit_page_with_browser(visit_url):
     '''Open a browser so the user can validate its identity.
 
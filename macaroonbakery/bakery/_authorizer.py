@@ -90,12 +90,19 @@ class ACLAuthorizer(Authorizer):
             return [], []
         allowed = [False] * len(ops)
         has_allow = isinstance(identity, ACLIdentity)
+        # The same operation may be requested more than once, so only
+        # look up and check its ACL the first time we see it.
+        op_allowed = {}
         for i, op in enumerate(ops):
-            acl = self._get_acl(ctx, op)
-            if has_allow:
-                allowed[i] = identity.allow(ctx, acl)
-            else:
-                allowed[i] = self._allow_public and EVERYONE in acl
+            ok = op_allowed.get(op)
+            if ok is None:
+                acl = self._get_acl(ctx, op)
+                if has_allow:
+                    ok = identity.allow(ctx, acl)
+                else:
+                    ok = self._allow_public and EVERYONE in acl
+                op_allowed[op] = ok
+            allowed[i] = ok
         return allowed, []
 
 
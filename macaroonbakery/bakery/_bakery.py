@@ -1,7 +1,6 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
 
-from ._authorizer import ClosedAuthorizer
 from ._checker import Checker
 import macaroonbakery.checkers as checkers
 from ._oven import Oven
@@ -12,7 +11,7 @@ class Bakery(object):
     '''
     def __init__(self, location=None, locator=None, ops_store=None, key=None,
                  identity_client=None, checker=None, root_key_store=None,
-                 authorizer=ClosedAuthorizer()):
+                 authorizer=None):
         '''Returns a new Bakery instance which combines an Oven with a
         Checker for the convenience of callers that wish to use both
         together.
@@ -43,16 +43,19 @@ class Checker(object):
     for creating the macaroons
     See the Oven type (TODO) for one way of doing that.
     '''
-    def __init__(self, checker=checkers.Checker(),
-                 authorizer=ClosedAuthorizer(),
+    def __init__(self, checker=None,
+                 authorizer=None,
                  identity_client=None,
                  macaroon_opstore=None):
         '''
         :param checker: a first party checker implementing a
+        checkers.FirstPartyCaveatChecker.
+        If this is None, a new checkers.Checker will be used.
         :param authorizer (Authorizer): used to check whether an authenticated
         user is allowed to perform operations.
         The identity parameter passed to authorizer.allow will always have been
         obtained from a call to identity_client.declared_identity.
+        If this is None, a ClosedAuthorizer will be used.
         :param identity_client (IdentityClient) used for interactions with the
         external identity service used for authentication.
         If this is None, no authentication will be possible.
@@ -60,6 +63,10 @@ class Checker(object):
         method): used to retrieve macaroon root keys and other associated
         information.
         '''
+        if checker is None:
+            checker = checkers.Checker()
+        if authorizer is None:
+            authorizer = ClosedAuthorizer()
         self._first_party_caveat_checker = checker
         self._authorizer = authorizer
         if identity_client is None:
@@ -21,7 +21,7 @@ import macaroonbakery.checkers as checkers
 emptyContext = checkers.AuthContext()
 
 
-def discharge_all(m, get_discharge, local_key=None):
+def discharge_all(m, get_discharge, local_key=None, executor=None):
     '''Gathers discharge macaroons for all the third party caveats in m
     (and any subsequent caveats required by those) using get_discharge to
     acquire each discharge macaroon.
@@ -39,6 +39,12 @@ def discharge_all(m, get_discharge, local_key=None):
     passed the external caveat payload found in m, if any.
     It should return a bakery.Macaroon object holding the discharge
     macaroon for the third party caveat.
+
+    If executor (concurrent.futures.Executor) is not None, the caveats
+    that are known at the same time are discharged concurrently by
+    submitting them to it, in which case get_discharge must be safe to
+    call from several threads at once. The order of the returned
+    macaroons does not depend on the executor.
     '''
     primary = m.macaroon
     discharges = [primary]
@@ -57,30 +63,38 @@ def discharge_all(m, get_discharge, local_key=None):
             need.append(
                 _NeedCaveat(cav=cav,
                             encrypted_caveat=encrypted_caveat))
-    add_caveats(m)
-    while len(need) > 0:
-        cav = need[0]
-        need = need[1:]
+
+    def discharge_caveat(cav):
         if cav.cav.location == 'local':
             if local_key is None:
                 raise ThirdPartyCaveatCheckFailed(
                     'found local third party caveat but no private key provided',
                 )
             # TODO use a small caveat id.
-            dm = discharge(ctx=emptyContext,
-                           key=local_key,
-                           checker=_LocalDischargeChecker(),
-                           caveat=cav.encrypted_caveat,
-                           id=cav.cav.caveat_id_bytes,
-                           locator=_EmptyLocator())
+            return discharge(ctx=emptyContext,
+                             key=local_key,
+                             checker=_LocalDischargeChecker(),
+                             caveat=cav.encrypted_caveat,
+                             id=cav.cav.caveat_id_bytes,
+                             locator=_EmptyLocator())
+        return get_discharge(cav.cav, cav.encrypted_caveat)
+
+    add_caveats(m)
+    while len(need) > 0:
+        # Discharge all the caveats found so far; any caveats found
+        # in their discharges are added to need for the next round.
+        current, need = need, []
+        if executor is None:
+            dms = map(discharge_caveat, current)
         else:
-            dm = get_discharge(cav.cav, cav.encrypted_caveat)
-        # It doesn't matter that we're invalidating dm here because we're
-        # about to throw it away.
-        discharge_m = dm.macaroon
-        m = primary.prepare_for_request(discharge_m)
-        discharges.append(m)
-        add_caveats(dm)
+            dms = executor.map(discharge_caveat, current)
+        for dm in dms:
+            # It doesn't matter that we're invalidating dm here because we're
+            # about to throw it away.
+            discharge_m = dm.macaroon
+            m = primary.prepare_for_request(discharge_m)
+            discharges.append(m)
+            add_caveats(dm)
     return discharges
 
 
@@ -69,11 +69,9 @@ class SimpleIdentity(ACLIdentity):
         '''Allow access to any ACL members that was equal to the user name.
 
         That is, some user u is considered a member of group u and no other.
+        Passing the ACL as a set or frozenset makes the check O(1).
         '''
-        for acl in acls:
-            if self._identity == acl:
-                return True
-        return False
+        return self._identity in acls
 
 
 class IdentityClient(object):
@@ -1,5 +1,6 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
+from binascii import a2b_base64
 
 import nacl.public
 
@@ -30,9 +31,7 @@ class PrivateKey(object):
         ''' Create a PrivateKey from a base64 encoded bytes.
         :return: a PrivateKey
         '''
-        return PrivateKey(
-            nacl.public.PrivateKey(serialized,
-                                   encoder=nacl.encoding.Base64Encoder))
+        return PrivateKey(nacl.public.PrivateKey(a2b_base64(serialized)))
 
     def serialize(self, raw=False):
         '''Encode the private part of the key in a base64 format by default,
@@ -85,9 +84,7 @@ class PublicKey(object):
         ''' Create a PublicKey from a base64 encoded bytes.
         :return: a PublicKey
         '''
-        return PublicKey(
-            nacl.public.PublicKey(serialized,
-                                  encoder=nacl.encoding.Base64Encoder))
+        return PublicKey(nacl.public.PublicKey(a2b_base64(serialized)))
 
     def __eq__(self, other):
         return self.key == other.key
@@ -8,8 +8,12 @@ import os
 
 import macaroonbakery.checkers as checkers
 import pymacaroons
-from macaroonbakery._utils import b64decode
-from pymacaroons.serializers import json_serializer
+from macaroonbakery._utils import (
+    b64decode,
+    json_loads,
+    macaroon_from_dict,
+    macaroon_to_dict,
+)
 from ._versions import (
     LATEST_VERSION,
     VERSION_0,
@@ -32,6 +36,14 @@ from ._third_party import (
 
 log = logging.getLogger(__name__)
 
+# _MACAROON_VERSIONS maps the bakery versions that predate version 2
+# macaroons to the macaroon version they use. Later bakery versions
+# all use version 2 macaroons.
+_MACAROON_VERSIONS = {
+    VERSION_0: pymacaroons.MACAROON_V1,
+    VERSION_1: pymacaroons.MACAROON_V1,
+}
+
 
 class Macaroon(object):
     '''Represent an undischarged macaroon along with its first
@@ -177,24 +189,40 @@ class Macaroon(object):
             if len(self._caveat_data) > 0:
                 raise ValueError('cannot serialize pre-version3 macaroon with '
                                  'external caveat data')
-            return json.loads(self._macaroon.serialize(
-                json_serializer.JsonSerializer()))
+            return macaroon_to_dict(self._macaroon)
         serialized = {
-            'm': json.loads(self._macaroon.serialize(
-                json_serializer.JsonSerializer())),
+            'm': macaroon_to_dict(self._macaroon),
             'v': self._version,
         }
         if self._namespace is not None:
             serialized['ns'] = self._namespace.serialize_text().decode('utf-8')
-        caveat_data = {}
-        for id in self._caveat_data:
-            key = base64.b64encode(id).decode('utf-8')
-            value = base64.b64encode(self._caveat_data[id]).decode('utf-8')
-            caveat_data[key] = value
-        if len(caveat_data) > 0:
-            serialized['cdata'] = caveat_data
+        if len(self._caveat_data) > 0:
+            b64encode = base64.b64encode
+            serialized['cdata'] = {
+                b64encode(id).decode('utf-8'): b64encode(data).decode('utf-8')
+                for id, data in self._caveat_data.items()
+            }
         return serialized
 
+    @classmethod
+    def _wrap(cls, m, version, namespace, caveat_data):
+        '''Return a Macaroon holding the given underlying macaroon.
+        Unlike __init__, this does not create a pymacaroons.Macaroon
+        that would immediately be replaced.
+        @param m the underlying macaroon {pymacaroons.Macaroon}
+        @param version the bakery version.
+        @param namespace the first party caveat namespace.
+        @param caveat_data the third party caveat data {dict}
+        @return {Macaroon}
+        '''
+        macaroon = cls.__new__(cls)
+        macaroon._macaroon = m
+        macaroon._version = version
+        macaroon._caveat_data = caveat_data
+        macaroon._namespace = namespace
+        macaroon._caveat_id_prefix = bytearray()
+        return macaroon
+
     @classmethod
     def from_dict(cls, json_dict):
         '''Return a macaroon obtained from the given dictionary as
@@ -204,13 +232,9 @@ class Macaroon(object):
         json_macaroon = json_dict.get('m')
         if json_macaroon is None:
             # Try the v1 format if we don't have a macaroon field.
-            m = pymacaroons.Macaroon.deserialize(
-                json.dumps(json_dict), json_serializer.JsonSerializer())
-            macaroon = Macaroon(root_key=None, id=None,
-                                namespace=legacy_namespace(),
-                                version=_bakery_version(m.version))
-            macaroon._macaroon = m
-            return macaroon
+            m = macaroon_from_dict(json_dict)
+            return Macaroon._wrap(m, _bakery_version(m.version),
+                                  legacy_namespace(), {})
 
         version = json_dict.get('v', None)
         if version is None:
@@ -218,25 +242,16 @@ class Macaroon(object):
         if (version < VERSION_3 or
                 version > LATEST_VERSION):
             raise ValueError('unknown bakery version {}'.format(version))
-        m = pymacaroons.Macaroon.deserialize(json.dumps(json_macaroon),
-                                             json_serializer.JsonSerializer())
+        m = macaroon_from_dict(json_macaroon)
         if m.version != macaroon_version(version):
             raise ValueError(
                 'underlying macaroon has inconsistent version; '
                 'got {} want {}'.format(m.version, macaroon_version(version)))
         namespace = checkers.deserialize_namespace(json_dict.get('ns'))
         cdata = json_dict.get('cdata', {})
-        caveat_data = {}
-        for id64 in cdata:
-            id = b64decode(id64)
-            data = b64decode(cdata[id64])
-            caveat_data[id] = data
-        macaroon = Macaroon(root_key=None, id=None,
-                            namespace=namespace,
-                            version=version)
-        macaroon._caveat_data = caveat_data
-        macaroon._macaroon = m
-        return macaroon
+        caveat_data = {b64decode(id64): b64decode(data64)
+                       for id64, data64 in cdata.items()}
+        return Macaroon._wrap(m, version, namespace, caveat_data)
 
     @classmethod
     def deserialize_json(cls, serialized_json):
@@ -244,7 +259,7 @@ class Macaroon(object):
         @param serialized_json The string to decode {str}
         @return {Macaroon}
         '''
-        serialized = json.loads(serialized_json)
+        serialized = json_loads(serialized_json)
         return Macaroon.from_dict(serialized)
 
     def _new_caveat_id(self, base):
@@ -256,9 +271,8 @@ class Macaroon(object):
         @param base bytes
         @return bytes
         '''
-        id = bytearray()
         if len(base) > 0:
-            id.extend(base)
+            id = bytearray(base)
         else:
             # Add a version byte to the caveat id. Technically
             # this is unnecessary as the caveat-decoding logic
@@ -267,29 +281,29 @@ class Macaroon(object):
             # payload, having this version gives a strong indication
             # that the payload has been omitted so we can produce
             # a better error for the user.
-            id.append(VERSION_3)
+            id = bytearray((VERSION_3,))
 
         # Iterate through integers looking for one that isn't already used,
         # starting from n so that if everyone is using this same algorithm,
         # we'll only perform one iteration.
         i = len(self._caveat_data)
-        caveats = self._macaroon.caveats
+        # Collect the existing third party caveat ids once so that each
+        # candidate can be checked without scanning all the caveats.
+        used = {cav.caveat_id for cav in self._macaroon.caveats
+                if cav.verification_key_id is not None}
+        prefix_len = len(id)
         while True:
             # We append a varint to the end of the id and assume that
             # any client that's created the id that we're using as a base
             # is using similar conventions - in the worst case they might
             # end up with a duplicate third party caveat id and thus create
             # a macaroon that cannot be discharged.
-            temp = id[:]
-            encode_uvarint(i, temp)
-            found = False
-            for cav in caveats:
-                if (cav.verification_key_id is not None
-                        and cav.caveat_id == temp):
-                    found = True
-                    break
-            if not found:
-                return bytes(temp)
+            # Reuse the buffer, dropping the previous candidate's varint.
+            del id[prefix_len:]
+            encode_uvarint(i, id)
+            candidate = bytes(id)
+            if candidate not in used:
+                return candidate
             i += 1
 
     def first_party_caveats(self):
@@ -313,10 +327,9 @@ class Macaroon(object):
         copying the macaroon does not make a copy of the namespace.
         :return a Macaroon
         '''
-        m1 = Macaroon(None, None, version=self._version,
-                      namespace=self._namespace)
-        m1._macaroon = self._macaroon.copy()
-        m1._caveat_data = self._caveat_data.copy()
+        m1 = Macaroon._wrap(self._macaroon.copy(), self._version,
+                            self._namespace, self._caveat_data.copy())
+        m1._caveat_id_prefix = self._caveat_id_prefix
         return m1
 
 
@@ -326,9 +339,7 @@ def macaroon_version(bakery_version):
     @param bakery_version the bakery version
     @return macaroon_version the derived macaroon version
     '''
-    if bakery_version in [VERSION_0, VERSION_1]:
-        return pymacaroons.MACAROON_V1
-    return pymacaroons.MACAROON_V2
+    return _MACAROON_VERSIONS.get(bakery_version, pymacaroons.MACAROON_V2)
 
 
 class ThirdPartyLocator(object):
@@ -383,21 +394,20 @@ def _parse_local_location(loc):
     caveat location.
     @return a ThirdPartyInfo.
     '''
-    if not (loc.startswith('local ')):
+    if not loc.startswith('local '):
         return None
-    v = VERSION_1
-    fields = loc.split()
-    fields = fields[1:]  # Skip 'local'
-    if len(fields) == 2:
+    fields = loc[len('local '):].split()
+    if len(fields) == 1:
+        v = VERSION_1
+    elif len(fields) == 2:
         try:
             v = int(fields[0])
         except ValueError:
             return None
-        fields = fields[1:]
-    if len(fields) == 1:
-        key = PublicKey.deserialize(fields[0])
-        return ThirdPartyInfo(public_key=key, version=v)
-    return None
+    else:
+        return None
+    key = PublicKey.deserialize(fields[-1])
+    return ThirdPartyInfo(public_key=key, version=v)
 
 
 def _bakery_version(v):
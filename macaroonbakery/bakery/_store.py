@@ -13,8 +13,7 @@ class MemoryOpsStore:
     def put_ops(self, key, time, ops):
         ''' Put an ops only if not already there, otherwise it's a no op.
         '''
-        if self._store.get(key) is None:
-            self._store[key] = ops
+        self._store.setdefault(key, ops)
 
     def get_ops(self, key):
         ''' Returns ops from the key if found otherwise raises a KeyError.
@@ -7,6 +7,8 @@ import macaroonbakery.checkers as checkers
 
 def legacy_namespace():
     ''' Standard namespace for pre-version3 macaroons.
+    A new Namespace is returned on every call, so callers may
+    register further prefixes on it.
     '''
     ns = checkers.Namespace(None)
     ns.register(checkers.STD_NAMESPACE, '')
@@ -47,6 +49,8 @@ class ThirdPartyCaveatInfo(namedtuple(
     third party caveat. {checkers.Namespace}
     '''
 
+    __slots__ = ()
+
 
 class ThirdPartyInfo(namedtuple('ThirdPartyInfo', 'version, public_key')):
     ''' ThirdPartyInfo holds information on a given third party
@@ -55,3 +59,5 @@ class ThirdPartyInfo(namedtuple('ThirdPartyInfo', 'version, public_key')):
     by the discharger {number}
     @param public_key Public key of the third party {PublicKey}
     '''
+
+    __slots__ = ()
@@ -1,7 +1,5 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
-import collections
-
 from ._caveat import error_caveat
 from ._utils import condition_with_prefix
 
@@ -14,9 +12,13 @@ class Namespace:
     prefix - this is usual when several different backwardly
     compatible schema versions are registered.
     '''
+    __slots__ = ('_uri_to_prefix', '_serialized')
 
     def __init__(self, uri_to_prefix=None):
         self._uri_to_prefix = {}
+        # _serialized caches the result of serialize_text; it is reset
+        # whenever a new URI is registered.
+        self._serialized = None
         if uri_to_prefix is not None:
             for k in uri_to_prefix:
                 self.register(k, uri_to_prefix[k])
@@ -38,13 +40,12 @@ class Namespace:
         separated with spaces.
         :return: bytes
         '''
-        if self._uri_to_prefix is None or len(self._uri_to_prefix) == 0:
-            return b''
-        od = collections.OrderedDict(sorted(self._uri_to_prefix.items()))
-        data = []
-        for uri in od:
-            data.append(uri + ':' + od[uri])
-        return ' '.join(data).encode('utf-8')
+        if self._serialized is None:
+            self._serialized = ' '.join(
+                uri + ':' + prefix
+                for uri, prefix in sorted(self._uri_to_prefix.items())
+            ).encode('utf-8')
+        return self._serialized
 
     def register(self, uri, prefix):
         '''Registers the given URI and associates it with the given prefix.
@@ -64,6 +65,7 @@ class Namespace:
                     prefix, uri))
         if self._uri_to_prefix.get(uri) is None:
             self._uri_to_prefix[uri] = prefix
+            self._serialized = None
 
     def resolve(self, uri):
         ''' Returns the prefix associated to the uri.
@@ -142,11 +144,10 @@ def deserialize_namespace(data):
     kvs = data.split()
     uri_to_prefix = {}
     for kv in kvs:
-        i = kv.rfind(':')
-        if i == -1:
+        uri, colon, prefix = kv.rpartition(':')
+        if not colon:
             raise ValueError('no colon in namespace '
                              'field {}'.format(repr(kv)))
-        uri, prefix = kv[0:i], kv[i + 1:]
         if not is_valid_schema_uri(uri):
             # Currently this can't happen because the only invalid URIs
             # are those which contain a space
@@ -162,4 +163,8 @@ def deserialize_namespace(data):
                 'duplicate URI {} in '
                 'namespace {}'.format(repr(uri), repr(data)))
         uri_to_prefix[uri] = prefix
-    return Namespace(uri_to_prefix)
+    # Every entry has been validated above, so there is no need to go
+    # through register again.
+    ns = Namespace()
+    ns._uri_to_prefix = uri_to_prefix
+    return ns
@@ -11,9 +11,7 @@ from ._interactor import (
     Interactor,
     LegacyInteractor,
 )
-from macaroonbakery._utils import visit_page_with_browser
-
-from six.moves.urllib.parse import urljoin
+from macaroonbakery._utils import relative_url, visit_page_with_browser
 
 
 class WebBrowserInteractor(Interactor, LegacyInteractor):
@@ -39,10 +37,8 @@ class WebBrowserInteractor(Interactor, LegacyInteractor):
         '''Implement Interactor.interact by opening the browser window
         and waiting for the discharge token'''
         p = ir_err.interaction_method(self.kind(), WebBrowserInteractionInfo)
-        if not location.endswith('/'):
-            location += '/'
-        visit_url = urljoin(location, p.visit_url)
-        wait_token_url = urljoin(location, p.wait_token_url)
+        visit_url = relative_url(location, p.visit_url)
+        wait_token_url = relative_url(location, p.wait_token_url)
         self._open_web_browser(visit_url)
         return self._wait_for_token(ctx, wait_token_url)
 
@@ -78,6 +74,9 @@ class WebBrowserInteractionInfo(namedtuple('WebBrowserInteractionInfo',
     :param wait_token_url holds a URL that will block on GET until the browser
     interaction has completed.
     '''
+
+    __slots__ = ()
+
     @classmethod
     def from_dict(cls, info_dict):
         '''Create a new instance of WebBrowserInteractionInfo, as expected
@@ -1,8 +1,10 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
 import base64
-import json
 import logging
+import threading
+import time
+from datetime import datetime
 
 import macaroonbakery.bakery as bakery
 import macaroonbakery.checkers as checkers
@@ -23,11 +25,39 @@ from ._interactor import (
 )
 
 import requests
-from six.moves.http_cookies import SimpleCookie
-from six.moves.urllib.parse import urljoin
+import six.moves.http_cookiejar as http_cookiejar
+from six.moves.urllib.parse import urlencode, urljoin
 
+# TIME_OUT holds the timeout, in seconds, of discharge and third party
+# info requests.
 TIME_OUT = 30
 MAX_DISCHARGE_RETRIES = 3
+# _DISCHARGE_STATUS_CODES holds the HTTP status codes that may be used
+# for a discharge-required error: 407 for version 0 clients and 401
+# otherwise.
+_DISCHARGE_STATUS_CODES = frozenset((401, 407))
+# _ERR_DISCHARGE_REQUIRED_BYTES holds the JSON encoding of the
+# discharge-required error code.
+_ERR_DISCHARGE_REQUIRED_BYTES = '"{}"'.format(
+    ERR_DISCHARGE_REQUIRED).encode('utf-8')
+# _LATEST_VERSION_STR holds the value sent in the BAKERY_PROTOCOL_HEADER
+# header of every request.
+_LATEST_VERSION_STR = str(bakery.LATEST_VERSION)
+# _DEFAULT_BAKERY_HEADERS holds the headers sent on requests that need
+# nothing else. requests copies them, so they are never mutated.
+_DEFAULT_BAKERY_HEADERS = {BAKERY_PROTOCOL_HEADER: _LATEST_VERSION_STR}
+# MAX_DISCHARGE_CACHE_SIZE holds the maximum number of discharged
+# macaroons remembered by a Client.
+MAX_DISCHARGE_CACHE_SIZE = 128
+
+# _EPOCH holds the Unix epoch as a naive UTC datetime, like the expiry
+# times returned by checkers.macaroons_expiry_time.
+_EPOCH = datetime(1970, 1, 1)
+
+# _non_interactive records whether the current thread is acquiring a
+# discharge concurrently with others, in which case no interaction
+# may take place.
+_non_interactive = threading.local()
 
 log = logging.getLogger('httpbakery')
 
@@ -37,6 +67,12 @@ class BakeryException(requests.RequestException):
     authorizer'''
 
 
+class _InteractionRequired(Exception):
+    '''Raised by Client._interact when a discharge that is being
+    acquired concurrently requires interaction.
+    '''
+
+
 class Client:
     '''Client holds the context for making HTTP requests with macaroons.
     To make a request, use the auth method to obtain
@@ -50,13 +86,27 @@ class Client:
         resp = requests.get('some protected url',
                             cookies=client.cookies,
                             auth=client.auth())
+    The HTTP connections used by the client itself to acquire
+    discharges are pooled; call close, or use the client as a
+    context manager, to release them.
     @param interaction_methods A list of Interactor implementations.
     @param key The private key of the client {bakery.PrivateKey}
     @param cookies storage for the cookies {CookieJar}. It should be the
     same as in the requests cookies. If not provided, one
     will be created.
+    @param discharge_executor if provided, used to acquire the
+    discharges of macaroons with several third party caveats
+    concurrently {concurrent.futures.Executor}. If not provided,
+    discharges are acquired sequentially. When one is provided,
+    acquire_discharge, including any override of it, is called from
+    the executor's threads and must be thread-safe. Interaction never
+    happens on those threads: discharges that require it are acquired
+    afterwards on the calling thread. Discharges needed while
+    acquiring another discharge are always acquired sequentially on
+    the worker, so a bounded executor cannot deadlock.
     '''
-    def __init__(self, interaction_methods=None, key=None, cookies=None):
+    def __init__(self, interaction_methods=None, key=None, cookies=None,
+                 discharge_executor=None):
         if interaction_methods is None:
             interaction_methods = [WebBrowserInteractor()]
         if cookies is None:
@@ -64,6 +114,31 @@ class Client:
         self._interaction_methods = interaction_methods
         self.key = key
         self.cookies = cookies
+        self._discharge_executor = discharge_executor
+        # _session is used for the requests made by the client itself
+        # so that connections to the same host can be reused. Its cookie
+        # jar refuses every cookie, so cookies set by servers are not
+        # kept between requests; the client's own cookies are passed
+        # explicitly.
+        self._session = requests.Session()
+        self._session.cookies = requests.cookies.RequestsCookieJar(
+            policy=http_cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        # _discharges maps the signature of a macaroon found in a
+        # discharge-required error to its serialized discharges and
+        # their expiry time. It may be used by several discharge
+        # workers at once, so it is guarded by _discharges_lock.
+        self._discharges = {}
+        self._discharges_lock = threading.Lock()
+
+    def close(self):
+        '''Release the HTTP connections held by the client.'''
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def auth(self):
         '''Return an authorizer object suitable for passing
@@ -84,7 +159,7 @@ class Client:
         # mentioned in kwargs?
         kwargs['auth'] = self.auth()
         kwargs['cookies'] = self.cookies
-        return requests.request(method=method, url=url, **kwargs)
+        return self._session.request(method=method, url=url, **kwargs)
 
     def handle_error(self, error, url):
         '''Try to resolve the given error, which should be a response
@@ -98,42 +173,132 @@ class Client:
             raise BakeryException('unable to read info in discharge error '
                                   'response')
 
-        discharges = bakery.discharge_all(
-            error.info.macaroon,
-            self.acquire_discharge,
-            self.key,
-        )
-        macaroons = '[' + ','.join(map(utils.macaroon_to_json_string,
-                                       discharges)) + ']'
-        all_macaroons = base64.urlsafe_b64encode(utils.to_bytes(macaroons))
+        all_macaroons, expires = self._discharge(error.info.macaroon)
 
         full_path = urljoin(url, error.info.macaroon_path)
         if error.info.cookie_name_suffix is not None:
             name = 'macaroon-' + error.info.cookie_name_suffix
         else:
             name = 'macaroon-auth'
-        expires = checkers.macaroons_expiry_time(checkers.Namespace(), discharges)
         self.cookies.set_cookie(utils.cookie(
             name=name,
-            value=all_macaroons.decode('ascii'),
+            value=all_macaroons,
             url=full_path,
             expires=expires,
         ))
 
+    def _discharge(self, m):
+        '''Return the base64-encoded discharges for the given macaroon
+        and their expiry time, reusing earlier discharges of the same
+        macaroon when they have not yet expired.
+        @param m The macaroon to discharge {macaroonbakery.Macaroon}
+        @return str, datetime
+        '''
+        sig = m.macaroon.signature
+        with self._discharges_lock:
+            cached = self._discharges.pop(sig, None)
+            if cached is not None:
+                expires = cached[1]
+                if (expires is None or
+                        (expires - _EPOCH).total_seconds() > time.time()):
+                    self._discharges[sig] = cached
+                    return cached
+        discharges = self._discharge_all(m)
+        macaroons = '[{}]'.format(
+            ','.join(map(utils.macaroon_to_json_string, discharges)))
+        all_macaroons = base64.urlsafe_b64encode(
+            macaroons.encode('utf-8')).decode('ascii')
+        expires = checkers.macaroons_expiry_time(checkers.Namespace(), discharges)
+        with self._discharges_lock:
+            # Another thread may have discharged the same macaroon
+            # meanwhile; the latest discharges win.
+            self._discharges.pop(sig, None)
+            if len(self._discharges) >= MAX_DISCHARGE_CACHE_SIZE:
+                # Evict the least recently used entry.
+                del self._discharges[next(iter(self._discharges))]
+            self._discharges[sig] = (all_macaroons, expires)
+        return all_macaroons, expires
+
+    def _forget_discharges(self, m):
+        '''Forget any earlier discharges of the given macaroon, so that
+        the next discharge-required error holding it is discharged
+        afresh.
+        @param m The discharged macaroon {macaroonbakery.Macaroon}
+        '''
+        with self._discharges_lock:
+            self._discharges.pop(m.macaroon.signature, None)
+
+    def _discharge_all(self, m):
+        '''Acquire all the discharges required by the given macaroon.
+        When the client has a discharge executor and the macaroon has
+        several third party caveats, their discharges are acquired
+        concurrently. If any of them requires interaction, the
+        remaining discharges are acquired sequentially so that the
+        user is never asked to interact more than once at a time.
+        @param m The macaroon to discharge {macaroonbakery.Macaroon}
+        @return [pymacaroons.Macaroon]
+        '''
+        # acquired maps the id of each caveat discharged concurrently
+        # to its discharge, so that none is requested twice.
+        acquired = {}
+        # A discharger may itself return a discharge-required error,
+        # in which case we are already running on a discharge worker.
+        # Waiting there for more work submitted to the same executor
+        # could deadlock once it is full, so discharge sequentially.
+        if (self._discharge_executor is not None and
+                len(m.third_party_caveats()) > 1 and
+                not getattr(_non_interactive, 'active', False)):
+            try:
+                return self._discharge_all_with(
+                    m, self._discharge_executor, acquired)
+            except _InteractionRequired:
+                log.debug('interaction required; acquiring discharges '
+                          'sequentially')
+
+        def get_discharge(cav, payload):
+            dm = acquired.pop(cav.caveat_id_bytes, None)
+            if dm is None:
+                dm = self.acquire_discharge(cav, payload)
+            return dm
+        return bakery.discharge_all(m, get_discharge, self.key)
+
+    def _discharge_all_with(self, m, executor, acquired):
+        def get_discharge(cav, payload):
+            dm = self._acquire_discharge_without_interaction(cav, payload)
+            acquired[cav.caveat_id_bytes] = dm
+            return dm
+        return bakery.discharge_all(m, get_discharge, self.key,
+                                    executor=executor)
+
+    def _acquire_discharge_without_interaction(self, cav, payload):
+        _non_interactive.active = True
+        try:
+            return self.acquire_discharge(cav, payload)
+        finally:
+            _non_interactive.active = False
+
     def acquire_discharge(self, cav, payload):
         ''' Request a discharge macaroon from the caveat location
         as an HTTP URL.
+        If the client has a discharge executor, this may be called
+        from several threads at once.
         @param cav Third party {pymacaroons.Caveat} to be discharged.
         @param payload External caveat data {bytes}.
         @return The acquired macaroon {macaroonbakery.Macaroon}
         '''
-        resp = self._acquire_discharge_with_token(cav, payload, None)
+        loc = cav.location
+        if not loc.endswith('/'):
+            loc = loc + '/'
+        target = urljoin(loc, 'discharge')
+        resp = self._acquire_discharge_with_token(cav, payload, None, target)
         # TODO Fabrice what is the other http response possible ??
         if resp.status_code == 200:
-            return bakery.Macaroon.from_dict(resp.json().get('Macaroon'))
+            return bakery.Macaroon.from_dict(
+                utils.json_loads(resp.content).get('Macaroon'))
         # A 5xx error might not return json.
         try:
-            cause = Error.from_dict(resp.json())
+            error_json = utils.json_loads(resp.content)
+            cause = Error.from_dict(error_json)
         except ValueError:
             raise DischargeError(
                 'unexpected response: [{}] {!r}'.format(resp.status_code, resp.content)
@@ -143,41 +308,46 @@ class Client:
         if cause.info is None:
             raise DischargeError(
                 'interaction-required response with no info: {}'.format(
-                    resp.json())
+                    error_json)
             )
-        loc = cav.location
-        if not loc.endswith('/'):
-            loc = loc + '/'
         token, m = self._interact(loc, cause, payload)
         if m is not None:
             # We've acquired the macaroon directly via legacy interaction.
             return m
         # Try to acquire the discharge again, but this time with
         # the token acquired by the interaction method.
-        resp = self._acquire_discharge_with_token(cav, payload, token)
+        resp = self._acquire_discharge_with_token(cav, payload, token, target)
         if resp.status_code == 200:
-            return bakery.Macaroon.from_dict(resp.json().get('Macaroon'))
+            return bakery.Macaroon.from_dict(
+                utils.json_loads(resp.content).get('Macaroon'))
         else:
             raise DischargeError(
                 'discharge failed with code {}'.format(resp.status_code))
 
-    def _acquire_discharge_with_token(self, cav, payload, token):
+    def _acquire_discharge_with_token(self, cav, payload, token, target=None):
         req = {}
         _add_json_binary_field(cav.caveat_id_bytes, req, 'id')
         if token is not None:
             _add_json_binary_field(token.value, req, 'token')
             req['token-kind'] = token.kind
         if payload is not None:
-            req['caveat64'] = base64.urlsafe_b64encode(payload).rstrip(
-                b'=').decode('utf-8')
-        loc = cav.location
-        if not loc.endswith('/'):
-            loc += '/'
-        target = urljoin(loc, 'discharge')
+            # The padding length follows from the payload length, so
+            # slice it off rather than scanning for it.
+            caveat64 = base64.urlsafe_b64encode(payload)
+            pad = -len(payload) % 3
+            if pad:
+                caveat64 = caveat64[:-pad]
+            req['caveat64'] = caveat64.decode('ascii')
+        if target is None:
+            target = utils.relative_url(cav.location, 'discharge')
+        # The form fields are all strings, so encode them directly
+        # rather than through requests' generic parameter encoding.
         headers = {
-            BAKERY_PROTOCOL_HEADER: str(bakery.LATEST_VERSION)
+            BAKERY_PROTOCOL_HEADER: _LATEST_VERSION_STR,
+            'Content-Type': 'application/x-www-form-urlencoded',
         }
-        return self.request('POST', target, data=req, headers=headers)
+        return self.request('POST', target, data=urlencode(req),
+                            headers=headers, timeout=TIME_OUT)
 
     def _interact(self, location, error_info, payload):
         '''Gathers a macaroon by directing the user to interact with a
@@ -185,6 +355,8 @@ class Client:
         error response.
         @return DischargeToken, bakery.Macaroon
         '''
+        if getattr(_non_interactive, 'active', False):
+            raise _InteractionRequired()
         if (self._interaction_methods is None or
                 len(self._interaction_methods) == 0):
             raise InteractionError('interaction required but not possible')
@@ -220,7 +392,8 @@ class Client:
             # We have several possible methods or we only support a non-window
             # method, so we need to fetch the possible methods supported by
             # the discharger.
-            method_urls = _legacy_get_interaction_methods(visit_url)
+            method_urls = _legacy_get_interaction_methods(
+                self._session, visit_url)
         for interactor in self._interaction_methods:
             kind = interactor.kind()
             if kind == WEB_BROWSER_INTERACTION_KIND:
@@ -237,7 +410,7 @@ class Client:
 
             visit_url = urljoin(location, visit_url)
             interactor.legacy_interact(self, location, visit_url)
-            return _wait_for_macaroon(wait_url)
+            return _wait_for_macaroon(self._session, wait_url)
 
         raise InteractionError('no methods supported; supported [{}]; provided [{}]'.format(
             ' '.join([x.kind() for x in self._interaction_methods]),
@@ -259,8 +432,8 @@ class _BakeryAuth:
         self._client = client
 
     def __call__(self, req):
-        req.headers[BAKERY_PROTOCOL_HEADER] = str(bakery.LATEST_VERSION)
-        hook = _prepare_discharge_hook(req.copy(), self._client)
+        req.headers[BAKERY_PROTOCOL_HEADER] = _LATEST_VERSION_STR
+        hook = _prepare_discharge_hook(req, self._client)
         req.register_hook(event='response', hook=hook)
         return req
 
@@ -275,21 +448,32 @@ def _prepare_discharge_hook(req, client):
         # Define a local class so that we can use its class variable as
         # mutable state accessed by the closures below.
         count = 0
+        # discharged holds the signatures of the macaroons that have
+        # been discharged while making this request.
+        discharged = set()
 
     def hook(response, *args, **kwargs):
         ''' Requests hooks system, this is the hook for the response.
         '''
         status_code = response.status_code
 
-        if status_code != 407 and status_code != 401:
+        if status_code not in _DISCHARGE_STATUS_CODES:
             return response
-        if (status_code == 401 and response.headers.get('WWW-Authenticate') !=
+        headers = response.headers
+        if (status_code == 401 and headers.get('WWW-Authenticate') !=
                 'Macaroon'):
             return response
 
-        if response.headers.get('Content-Type') != 'application/json':
+        # Allow for parameters such as "; charset=utf-8".
+        content_type = headers.get('Content-Type', '')
+        if not content_type.startswith('application/json'):
             return response
-        errorJSON = response.json()
+        content = response.content
+        # Checking for the error code in the raw body is much cheaper
+        # than parsing it, and is enough to rule out most other errors.
+        if _ERR_DISCHARGE_REQUIRED_BYTES not in content:
+            return response
+        errorJSON = utils.json_loads(content)
         if errorJSON.get('Code') != ERR_DISCHARGE_REQUIRED:
             return response
         error = Error.from_dict(errorJSON)
@@ -298,15 +482,30 @@ def _prepare_discharge_hook(req, client):
             raise BakeryException('too many ({}) discharge requests'.format(
                 Retry.count)
             )
+        info = error.info
+        if info is not None and info.macaroon is not None:
+            sig = info.macaroon.macaroon.signature
+            if sig in Retry.discharged:
+                # The server has rejected the discharges we sent for
+                # this macaroon, so don't use them again.
+                client._forget_discharges(info.macaroon)
+            Retry.discharged.add(sig)
         client.handle_error(error, req.url)
-        req.headers.pop('Cookie', None)
-        req.prepare_cookies(client.cookies)
-        req.headers[BAKERY_PROTOCOL_HEADER] = \
-            str(bakery.LATEST_VERSION)
-        with requests.Session() as s:
-            settings = s.merge_environment_settings(
-                req.url, {}, None, None, None)
-            return s.send(req, **settings)
+        # Only copy the request now that we know it will be retried.
+        retry = req.copy()
+        # prepare_cookies leaves an existing Cookie header alone, so
+        # it must be removed first for the new discharges to be sent.
+        retry.headers.pop('Cookie', None)
+        retry.prepare_cookies(client.cookies)
+        retry.headers[BAKERY_PROTOCOL_HEADER] = _LATEST_VERSION_STR
+        s = client._session
+        if kwargs:
+            # Retry with the same settings (timeout, verify, proxies...)
+            # that the original request was sent with.
+            return s.send(retry, **kwargs)
+        settings = s.merge_environment_settings(
+            retry.url, {}, None, None, None)
+        return s.send(retry, **settings)
     return hook
 
 
@@ -326,35 +525,46 @@ def extract_macaroons(headers_or_request):
 
     mss = []
 
-    def add_macaroon(data):
-        try:
-            data = utils.b64decode(data)
-            data_as_objs = json.loads(data.decode('utf-8'))
-        except ValueError:
-            return
-        ms = [utils.macaroon_from_dict(x) for x in data_as_objs]
-        mss.append(ms)
-
     cookie_header = get_header('Cookie')
     if cookie_header is not None:
-        cs = SimpleCookie()
-        # The cookie might be a unicode object, so convert it
-        # to ASCII. This may cause an exception under Python 2.
-        # TODO is that a problem?
-        cs.load(str(cookie_header))
-        for c in cs:
-            if c.startswith('macaroon-'):
-                add_macaroon(cs[c].value)
+        # Only the values of the macaroon cookies are of interest, so
+        # split the header directly rather than parsing every cookie.
+        for c in cookie_header.split(';'):
+            name, _, value = c.partition('=')
+            if not name.strip().startswith('macaroon-'):
+                continue
+            value = value.strip()
+            if len(value) > 1 and value[0] == '"' and value[-1] == '"':
+                value = value[1:-1]
+            ms = _decode_macaroons(value)
+            if ms is not None:
+                mss.append(ms)
     # Python doesn't make it easy to have multiple values for a
     # key, so split the header instead, which is necessary
     # for HTTP1.1 compatibility anyway (see RFC 7230, section 3.2.2)
     macaroon_header = get_header('Macaroons')
     if macaroon_header is not None:
         for h in macaroon_header.split(','):
-            add_macaroon(h)
+            ms = _decode_macaroons(h)
+            if ms is not None:
+                mss.append(ms)
     return mss
 
 
+def _decode_macaroons(data):
+    ''' Decodes a list of macaroons as found in a macaroon cookie or
+    Macaroons header value: a base64-encoded JSON array of macaroons.
+    @param data: the encoded value {str}
+    @return: a list of pymacaroons macaroons, or None if data
+    could not be decoded.
+    '''
+    try:
+        data_as_objs = utils.json_loads(utils.b64decode(data))
+    except ValueError:
+        return None
+    return [utils.macaroon_from_dict(x) for x in data_as_objs]
+
+
 def _add_json_binary_field(b, serialized, field):
     '''' Set the given field to the given val (bytes) in the serialized
     dictionary.
@@ -369,36 +579,32 @@ def _add_json_binary_field(b, serialized, field):
         serialized[field + '64'] = val
 
 
-def _wait_for_macaroon(wait_url):
+def _wait_for_macaroon(session, wait_url):
     ''' Returns a macaroon from a legacy wait endpoint.
     '''
-    headers = {
-        BAKERY_PROTOCOL_HEADER: str(bakery.LATEST_VERSION)
-    }
-    resp = requests.get(url=wait_url, headers=headers)
+    resp = session.get(url=wait_url, headers=_DEFAULT_BAKERY_HEADERS)
     if resp.status_code != 200:
         raise InteractionError('cannot get {}'.format(wait_url))
 
-    return bakery.Macaroon.from_dict(resp.json().get('Macaroon'))
+    return bakery.Macaroon.from_dict(
+        utils.json_loads(resp.content).get('Macaroon'))
 
 
-def _legacy_get_interaction_methods(u):
+def _legacy_get_interaction_methods(session, u):
     ''' Queries a URL as found in an ErrInteractionRequired VisitURL field to
     find available interaction methods.
     It does this by sending a GET request to the URL with the Accept
     header set to "application/json" and parsing the resulting
     response as a dict.
     '''
-    headers = {
-        BAKERY_PROTOCOL_HEADER: str(bakery.LATEST_VERSION),
-        'Accept': 'application/json'
-    }
-    resp = requests.get(url=u, headers=headers)
+    headers = dict(_DEFAULT_BAKERY_HEADERS)
+    headers['Accept'] = 'application/json'
+    resp = session.get(url=u, headers=headers)
     method_urls = {}
     if resp.status_code == 200:
-        json_resp = resp.json()
-        for m in json_resp:
-            method_urls[m] = urljoin(u, json_resp[m])
+        json_resp = utils.json_loads(resp.content)
+        method_urls = {m: urljoin(u, method_url)
+                       for m, method_url in json_resp.items()}
 
     if method_urls.get('interactive') is None:
         # There's no "interactive" method returned, but we know
@@ -8,6 +8,13 @@ import macaroonbakery.bakery as bakery
 ERR_INTERACTION_REQUIRED = 'interaction required'
 ERR_DISCHARGE_REQUIRED = 'macaroon discharge required'
 
+# _DISCHARGE_REQUIRED_HEADERS holds the headers to set on a
+# discharge-required response.
+_DISCHARGE_REQUIRED_HEADERS = {
+    'WWW-Authenticate': 'Macaroon',
+    'Content-Type': 'application/json',
+}
+
 
 class InteractionMethodNotFound(Exception):
     '''This is thrown by client-side interaction methods when
@@ -50,19 +57,18 @@ def discharge_required_response(macaroon, path, cookie_suffix_name,
         message = 'discharge required'
     content = json.dumps(
         {
-            'Code': 'macaroon discharge required',
+            'Code': ERR_DISCHARGE_REQUIRED,
             'Message': message,
             'Info': {
                 'Macaroon': macaroon.to_dict(),
                 'MacaroonPath': path,
                 'CookieNameSuffix': cookie_suffix_name
             },
-        }
+        },
+        separators=(',', ':'),
     ).encode('utf-8')
-    return content, {
-        'WWW-Authenticate': 'Macaroon',
-        'Content-Type': 'application/json'
-    }
+    # Return a copy so that callers are free to add their own headers.
+    return content, dict(_DISCHARGE_REQUIRED_HEADERS)
 
 # BAKERY_PROTOCOL_HEADER is the header that HTTP clients should set
 # to determine the bakery protocol version. If it is 0 or missing,
@@ -183,18 +189,13 @@ class ErrorInfo(
         '''
         if serialized is None:
             return None
-        macaroon = serialized.get('Macaroon')
+        get = serialized.get
+        macaroon = get('Macaroon')
         if macaroon is not None:
             macaroon = bakery.Macaroon.from_dict(macaroon)
-        path = serialized.get('MacaroonPath')
-        cookie_name_suffix = serialized.get('CookieNameSuffix')
-        visit_url = serialized.get('VisitURL')
-        wait_url = serialized.get('WaitURL')
-        interaction_methods = serialized.get('InteractionMethods')
-        return ErrorInfo(macaroon=macaroon, macaroon_path=path,
-                         cookie_name_suffix=cookie_name_suffix,
-                         visit_url=visit_url, wait_url=wait_url,
-                         interaction_methods=interaction_methods)
+        return ErrorInfo(macaroon, get('MacaroonPath'),
+                         get('CookieNameSuffix'), get('InteractionMethods'),
+                         get('VisitURL'), get('WaitURL'))
 
     def __new__(cls, macaroon=None, macaroon_path=None,
                 cookie_name_suffix=None, interaction_methods=None,
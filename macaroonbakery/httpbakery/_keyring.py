@@ -1,16 +1,28 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
+import threading
+
 import macaroonbakery.bakery as bakery
 import requests
+from ._client import TIME_OUT
 from ._error import BAKERY_PROTOCOL_HEADER
 
 from six.moves.urllib.parse import urlparse
 
+# _HEADERS holds the headers sent with third party info requests.
+# LATEST_VERSION is fixed for the life of the process.
+_HEADERS = {BAKERY_PROTOCOL_HEADER: str(bakery.LATEST_VERSION)}
+# MAX_CACHE_SIZE holds the maximum number of locations whose third
+# party info is remembered by a ThirdPartyLocator.
+MAX_CACHE_SIZE = 1024
+
 
 class ThirdPartyLocator(bakery.ThirdPartyLocator):
     ''' Implements macaroonbakery.ThirdPartyLocator by first looking in the
     backing cache and, if that fails, making an HTTP request to find the
     information associated with the given discharge location.
+    The HTTP connections are pooled and reused across lookups; call
+    close, or use the locator as a context manager, to release them.
     '''
 
     def __init__(self, allow_insecure=False):
@@ -20,6 +32,21 @@ class ThirdPartyLocator(bakery.ThirdPartyLocator):
         '''
         self._allow_insecure = allow_insecure
         self._cache = {}
+        # _lock guards _cache and _in_flight, which maps each location
+        # whose info is being fetched to an event set once it has been.
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._session = requests.Session()
+
+    def close(self):
+        '''Release the HTTP connections held by the locator.'''
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def third_party_info(self, loc):
         u = urlparse(loc)
@@ -27,18 +54,43 @@ class ThirdPartyLocator(bakery.ThirdPartyLocator):
             raise bakery.ThirdPartyInfoNotFound(
                 'untrusted discharge URL {}'.format(loc))
         loc = loc.rstrip('/')
-        info = self._cache.get(loc)
-        if info is not None:
-            return info
+        while True:
+            with self._lock:
+                info = self._cache.pop(loc, None)
+                if info is not None:
+                    # Reinsert to mark the entry as most recently used.
+                    self._cache[loc] = info
+                    return info
+                fetched = self._in_flight.get(loc)
+                if fetched is None:
+                    fetched = self._in_flight[loc] = threading.Event()
+                    break
+            # Another thread is fetching the info for this location;
+            # wait for it rather than making the same request. If it
+            # fails, try again ourselves.
+            fetched.wait()
+        try:
+            info = self._fetch_info(loc)
+            with self._lock:
+                if len(self._cache) >= MAX_CACHE_SIZE:
+                    # Evict the least recently used entry.
+                    del self._cache[next(iter(self._cache))]
+                self._cache[loc] = info
+        finally:
+            with self._lock:
+                del self._in_flight[loc]
+            fetched.set()
+        return info
+
+    def _fetch_info(self, loc):
         url_endpoint = '/discharge/info'
-        headers = {
-            BAKERY_PROTOCOL_HEADER: str(bakery.LATEST_VERSION)
-        }
-        resp = requests.get(url=loc + url_endpoint, headers=headers)
+        resp = self._session.get(url=loc + url_endpoint, headers=_HEADERS,
+                                 timeout=TIME_OUT)
         status_code = resp.status_code
         if status_code == 404:
             url_endpoint = '/publickey'
-            resp = requests.get(url=loc + url_endpoint, headers=headers)
+            resp = self._session.get(url=loc + url_endpoint,
+                                     headers=_HEADERS, timeout=TIME_OUT)
             status_code = resp.status_code
         if status_code != 200:
             raise bakery.ThirdPartyInfoNotFound(
@@ -53,8 +105,7 @@ class ThirdPartyLocator(bakery.ThirdPartyLocator):
                 'no public key found in /discharge/info')
         idm_pk = bakery.PublicKey.deserialize(pk)
         version = json_resp.get('Version', bakery.VERSION_1)
-        self._cache[loc] = bakery.ThirdPartyInfo(
+        return bakery.ThirdPartyInfo(
             version=version,
             public_key=idm_pk
         )
-        return self._cache.get(loc)
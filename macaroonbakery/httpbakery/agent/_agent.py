@@ -1,16 +1,13 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
 import copy
-import json
 import logging
 from collections import namedtuple
 
 import macaroonbakery.bakery as bakery
 import macaroonbakery.httpbakery as httpbakery
 import macaroonbakery._utils as utils
-import requests.cookies
-
-from six.moves.urllib.parse import urljoin
+import requests
 
 log = logging.getLogger(__name__)
 
@@ -30,7 +27,7 @@ def load_auth_info(filename):
     @return AuthInfo The authentication information
     @raises AgentFileFormatError when the file format is bad.
     '''
-    with open(filename) as f:
+    with open(filename, 'rb') as f:
         return read_auth_info(f.read())
 
 
@@ -39,12 +36,12 @@ def read_auth_info(agent_file_content):
     specified content string, as read from an agents file.
     The returned information is suitable for passing as an argument
     to the AgentInteractor constructor.
-    @param agent_file_content The agent file content (str)
+    @param agent_file_content The agent file content (str or bytes)
     @return AuthInfo The authentication information
     @raises AgentFileFormatError when the file format is bad.
     '''
     try:
-        data = json.loads(agent_file_content)
+        data = utils.json_loads(agent_file_content)
         return AuthInfo(
             key=bakery.PrivateKey.deserialize(data['key']['private']),
             agents=list(
@@ -106,9 +103,7 @@ class AgentInteractor(httpbakery.Interactor, httpbakery.LegacyInteractor):
             raise httpbakery.InteractionError(
                 'no login-url field found in agent interaction method')
         agent = self._find_agent(location)
-        if not location.endswith('/'):
-            location += '/'
-        login_url = urljoin(location, p.login_url)
+        login_url = utils.relative_url(location, p.login_url)
         resp = requests.get(
             login_url, params={
                 'username': agent.username,
@@ -124,18 +119,17 @@ class AgentInteractor(httpbakery.Interactor, httpbakery.LegacyInteractor):
             raise httpbakery.InteractionError('no macaroon in response')
         m = bakery.Macaroon.from_dict(m)
         ms = bakery.discharge_all(m, None, self._auth_info.key)
-        b = bytearray()
-        for m in ms:
-            b.extend(utils.b64decode(m.serialize()))
-        return httpbakery.DischargeToken(kind='agent', value=bytes(b))
+        b = b''.join(utils.b64decode(m.serialize()) for m in ms)
+        return httpbakery.DischargeToken(kind='agent', value=b)
 
     def _find_agent(self, location):
         ''' Finds an appropriate agent entry for the given location.
         :return Agent
         '''
+        # Don't worry about trailing slashes
+        location_url = location.rstrip('/')
         for a in self._auth_info.agents:
-            # Don't worry about trailing slashes
-            if a.url.rstrip('/') == location.rstrip('/'):
+            if a.url.rstrip('/') == location_url:
                 return a
         raise httpbakery.InteractionMethodNotFound(
             'cannot find username for discharge location {}'.format(location))
@@ -173,6 +167,8 @@ class Agent(namedtuple('Agent', 'url, username')):
     @param username holds the username agent (string).
     '''
 
+    __slots__ = ()
+
 
 class AuthInfo(namedtuple('AuthInfo', 'key, agents')):
     ''' Holds the agent information required to set up agent authentication
@@ -183,3 +179,5 @@ class AuthInfo(namedtuple('AuthInfo', 'key, agents')):
     @param key the agent's private key (bakery.PrivateKey).
     @param agents information about the known agents (list of Agent).
     '''
+
+    __slots__ = ()
@@ -1,12 +1,12 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
-import json
 import logging
 import os
 import tempfile
 from datetime import datetime, timedelta
 from unittest import TestCase
 
+import macaroonbakery._utils as utils
 import macaroonbakery.bakery as bakery
 import macaroonbakery.checkers as checkers
 import macaroonbakery.httpbakery as httpbakery
@@ -22,25 +22,32 @@ PRIVATE_KEY = 'CqoSgj06Zcgb4/S6RT4DpTjLAfKoznEY3JsShSjKJEU='
 PUBLIC_KEY = 'YAhRSsth3a36mRYqQGQaLiS4QJax0p356nd+B8x7UQE='
 
 
+def _write_temp_file(content):
+    with tempfile.NamedTemporaryFile('w', delete=False) as f:
+        f.write(content)
+    return f.name
+
+
 class TestAgents(TestCase):
-    def setUp(self):
-        fd, filename = tempfile.mkstemp()
-        with os.fdopen(fd, 'w') as f:
-            f.write(agent_file)
-        self.agent_filename = filename
-        fd, filename = tempfile.mkstemp()
-        with os.fdopen(fd, 'w') as f:
-            f.write(bad_key_agent_file)
-        self.bad_key_agent_filename = filename
-        fd, filename = tempfile.mkstemp()
-        with os.fdopen(fd, 'w') as f:
-            f.write(no_username_agent_file)
-        self.no_username_agent_filename = filename
-
-    def tearDown(self):
-        os.remove(self.agent_filename)
-        os.remove(self.bad_key_agent_filename)
-        os.remove(self.no_username_agent_filename)
+    @classmethod
+    def setUpClass(cls):
+        # The agent files are only ever read, so write them once for
+        # all the tests.
+        cls.agent_filename = _write_temp_file(agent_file)
+        cls.bad_key_agent_filename = _write_temp_file(bad_key_agent_file)
+        cls.no_username_agent_filename = _write_temp_file(
+            no_username_agent_file)
+        # Key generation is comparatively slow and the keys are never
+        # mutated, so share them between the tests too.
+        cls.discharge_key = bakery.generate_key()
+        cls.server_key = bakery.generate_key()
+        cls.agent_key = bakery.generate_key()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.agent_filename)
+        os.remove(cls.bad_key_agent_filename)
+        os.remove(cls.no_username_agent_filename)
 
     def test_load_auth_info(self):
         auth_info = agent.load_auth_info(self.agent_filename)
@@ -69,18 +76,9 @@ class TestAgents(TestCase):
             agent.load_auth_info(self.no_username_agent_filename)
 
     def test_agent_login(self):
-        discharge_key = bakery.generate_key()
-
-        class _DischargerLocator(bakery.ThirdPartyLocator):
-            def third_party_info(self, loc):
-                if loc == 'http://0.3.2.1':
-                    return bakery.ThirdPartyInfo(
-                        public_key=discharge_key.public_key,
-                        version=bakery.LATEST_VERSION,
-                    )
-        d = _DischargerLocator()
-        server_key = bakery.generate_key()
-        server_bakery = bakery.Bakery(key=server_key, locator=d)
+        discharge_key = self.discharge_key
+        server_bakery = bakery.Bakery(
+            key=self.server_key, locator=_DischargerLocator(discharge_key))
 
         @urlmatch(path='.*/here')
         def server_get(url, request):
@@ -174,18 +172,9 @@ class TestAgents(TestCase):
         self.assertEqual(resp.content, b'done')
 
     def test_agent_legacy(self):
-        discharge_key = bakery.generate_key()
-
-        class _DischargerLocator(bakery.ThirdPartyLocator):
-            def third_party_info(self, loc):
-                if loc == 'http://0.3.2.1':
-                    return bakery.ThirdPartyInfo(
-                        public_key=discharge_key.public_key,
-                        version=bakery.LATEST_VERSION,
-                    )
-        d = _DischargerLocator()
-        server_key = bakery.generate_key()
-        server_bakery = bakery.Bakery(key=server_key, locator=d)
+        discharge_key = self.discharge_key
+        server_bakery = bakery.Bakery(
+            key=self.server_key, locator=_DischargerLocator(discharge_key))
 
         @urlmatch(path='.*/here')
         def server_get(url, request):
@@ -264,8 +253,6 @@ class TestAgents(TestCase):
                         },
                         headers={'Content-Type': 'application/json'})
 
-        key = bakery.generate_key()
-
         @urlmatch(path='.*/visit')
         def visit(url, request):
             if request.headers.get('Accept') == 'application/json':
@@ -282,7 +269,7 @@ class TestAgents(TestCase):
             if request.method != "POST":
                 raise Exception('unexpected method')
             log.info('agent_visit url {}'.format(url))
-            body = json.loads(request.body.decode('utf-8'))
+            body = utils.json_loads(request.body)
             if body['username'] != 'test-user':
                 raise Exception('unexpected username in body {!r}'.format(request.body))
             public_key = bakery.PublicKey.deserialize(body['public_key'])
@@ -325,7 +312,7 @@ class TestAgents(TestCase):
                 InfoStorage.info.caveat,
                 discharge_key,
                 EmptyChecker(),
-                _DischargerLocator(),
+                _DischargerLocator(discharge_key),
             )
             return {
                 'status_code': 200,
@@ -342,7 +329,7 @@ class TestAgents(TestCase):
             client = httpbakery.Client(interaction_methods=[
                 agent.AgentInteractor(
                     agent.AuthInfo(
-                        key=key,
+                        key=self.agent_key,
                         agents=[agent.Agent(username='test-user',
                                             url=u'http://0.3.2.1')],
                     ),
@@ -408,6 +395,18 @@ no_username_agent_file = '''
 '''
 
 
+class _DischargerLocator(bakery.ThirdPartyLocator):
+    def __init__(self, discharge_key):
+        self._discharge_key = discharge_key
+
+    def third_party_info(self, loc):
+        if loc == 'http://0.3.2.1':
+            return bakery.ThirdPartyInfo(
+                public_key=self._discharge_key.public_key,
+                version=bakery.LATEST_VERSION,
+            )
+
+
 class ThirdPartyCaveatCheckerF(bakery.ThirdPartyCaveatChecker):
     def __init__(self, check):
         self._check = check
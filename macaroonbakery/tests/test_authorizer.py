@@ -81,10 +81,26 @@ class TestAuthorizer(TestCase):
              [bakery.Op(entity='a', action='a')],
              [True])
         ]
-        for test in tests:
-            allowed, caveats = test[1].authorize(ctx, test[2], test[3])
-            self.assertEqual(len(caveats), 0)
-            self.assertEqual(allowed, test[4])
+        for name, authorizer, identity, ops, expect_allowed in tests:
+            allowed, caveats = authorizer.authorize(ctx, identity, ops)
+            self.assertEqual(len(caveats), 0, name)
+            self.assertEqual(allowed, expect_allowed, name)
+
+    def test_acl_authorizer_gets_acl_once_per_op(self):
+        calls = []
+
+        def get_acl(ctx, op):
+            calls.append(op)
+            return [bakery.EVERYONE]
+
+        op = bakery.Op(entity='a', action='a')
+        allowed, caveats = bakery.ACLAuthorizer(
+            allow_public=True,
+            get_acl=get_acl,
+        ).authorize(checkers.AuthContext(), None, [op, op])
+        self.assertEqual(allowed, [True, True])
+        self.assertEqual(caveats, [])
+        self.assertEqual(calls, [op])
 
     def test_context_wired_properly(self):
         ctx = checkers.AuthContext({'a': 'aval'})
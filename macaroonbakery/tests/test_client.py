@@ -5,6 +5,7 @@ import datetime
 import json
 import platform
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import macaroonbakery.bakery as bakery
 import macaroonbakery.checkers as checkers
@@ -18,7 +19,8 @@ from fixtures import (
     EnvironmentVariable,
     TestWithFixtures,
 )
-from httmock import HTTMock, urlmatch
+from httmock import HTTMock, response, urlmatch
+from mock import patch
 from six.moves.urllib.parse import parse_qs
 from six.moves.urllib.request import Request
 
@@ -596,6 +598,50 @@ class TestClient(TestWithFixtures):
         self.assertEqual(macaroons[0][0].identifier, m1.identifier)
         self.assertEqual(macaroons[1][0].identifier, m2.identifier)
 
+    def test_extract_macaroons_from_cookie_header(self):
+        m = pymacaroons.Macaroon(version=pymacaroons.MACAROON_V2, identifier='one')
+        value = base64.urlsafe_b64encode(utils.to_bytes(
+            '[' + utils.macaroon_to_json_string(m) + ']')).decode('ascii')
+        macaroons = httpbakery.extract_macaroons({
+            'Cookie': 'session=xyz; macaroon-a={}; macaroon-b="{}"; '
+                      'macaroon-bad=!!; other=1'.format(value, value),
+        })
+        self.assertEqual(len(macaroons), 2)
+        for ms in macaroons:
+            self.assertEqual(len(ms), 1)
+            self.assertEqual(ms[0].identifier, m.identifier)
+
+    def test_request_does_not_keep_server_cookies(self):
+        class SetCookieHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Set-Cookie', 'foo=bar')
+                self.send_header('Content-Length', '0')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+
+        try:
+            httpd = HTTPServer(('', 0), SetCookieHandler)
+            thread = threading.Thread(target=httpd.serve_forever)
+            thread.start()
+            client = httpbakery.Client()
+            for _ in range(2):
+                resp = client.request(
+                    'GET', 'http://' + httpd.server_address[0] + ':' +
+                    str(httpd.server_address[1]))
+                self.assertEqual(resp.cookies.get('foo'), 'bar')
+                self.assertNotIn('Cookie', resp.request.headers)
+            self.assertEqual(len(client.cookies), 0)
+        finally:
+            httpd.shutdown()
+
+    def test_context_manager_closes_session(self):
+        with patch.object(requests.Session, 'close') as close:
+            with httpbakery.Client() as client:
+                self.assertIsInstance(client, httpbakery.Client)
+                self.assertFalse(close.called)
+        close.assert_called_once_with()
+
     def test_handle_error_cookie_path(self):
         macaroon = bakery.Macaroon(
             root_key=b'some key', id=b'xxx',
@@ -616,6 +662,271 @@ class TestClient(TestWithFixtures):
         [cookie] = client.cookies
         self.assertEqual(cookie.path, "/some/")
 
+    def test_handle_error_reuses_discharges(self):
+        key = bakery.generate_key()
+        locator = bakery.ThirdPartyStore()
+        locator.add_info('http://1.2.3.4', bakery.ThirdPartyInfo(
+            public_key=key.public_key,
+            version=bakery.LATEST_VERSION,
+        ))
+        b = new_bakery('loc', locator, None)
+        m = b.oven.macaroon(
+            version=bakery.LATEST_VERSION, expiry=AGES,
+            caveats=[checkers.Caveat(location='http://1.2.3.4',
+                                     condition='is-ok')],
+            ops=[TEST_OP])
+        error = httpbakery.Error(
+            code=httpbakery.ERR_DISCHARGE_REQUIRED,
+            message='error',
+            version=bakery.LATEST_VERSION,
+            info=httpbakery.ErrorInfo(macaroon=m, macaroon_path='/'))
+
+        discharges = []
+
+        @urlmatch(path='.*/discharge')
+        def discharge(url, request):
+            qs = parse_qs(request.body)
+            content = {q: qs[q][0] for q in qs}
+            dm = httpbakery.discharge(checkers.AuthContext(), content, key,
+                                      locator, alwaysOK3rd)
+            discharges.append(dm)
+            return {
+                'status_code': 200,
+                'content': {
+                    'Macaroon': dm.to_dict()
+                }
+            }
+
+        client = httpbakery.Client()
+        with HTTMock(discharge):
+            client.handle_error(error, 'http://example.com/')
+            client.handle_error(error, 'http://example.org/')
+        self.assertEqual(len(discharges), 1)
+        self.assertEqual(len(client.cookies), 2)
+
+    def test_handle_error_does_not_reuse_expired_discharges(self):
+        key = bakery.generate_key()
+        locator = bakery.ThirdPartyStore()
+        locator.add_info('http://1.2.3.4', bakery.ThirdPartyInfo(
+            public_key=key.public_key,
+            version=bakery.LATEST_VERSION,
+        ))
+        b = new_bakery('loc', locator, None)
+        m = b.oven.macaroon(
+            version=bakery.LATEST_VERSION,
+            expiry=datetime.datetime(2000, 1, 1),
+            caveats=[checkers.Caveat(location='http://1.2.3.4',
+                                     condition='is-ok')],
+            ops=[TEST_OP])
+        error = httpbakery.Error(
+            code=httpbakery.ERR_DISCHARGE_REQUIRED,
+            message='error',
+            version=bakery.LATEST_VERSION,
+            info=httpbakery.ErrorInfo(macaroon=m, macaroon_path='/'))
+
+        discharges = []
+
+        @urlmatch(path='.*/discharge')
+        def discharge(url, request):
+            qs = parse_qs(request.body)
+            content = {q: qs[q][0] for q in qs}
+            dm = httpbakery.discharge(checkers.AuthContext(), content, key,
+                                      locator, alwaysOK3rd)
+            discharges.append(dm)
+            return {
+                'status_code': 200,
+                'content': {
+                    'Macaroon': dm.to_dict()
+                }
+            }
+
+        client = httpbakery.Client()
+        with HTTMock(discharge):
+            client.handle_error(error, 'http://example.com/')
+            client.handle_error(error, 'http://example.com/')
+        self.assertEqual(len(discharges), 2)
+
+    def test_rejected_discharges_are_not_reused(self):
+        key = bakery.generate_key()
+        locator = bakery.ThirdPartyStore()
+        locator.add_info('http://1.2.3.4', bakery.ThirdPartyInfo(
+            public_key=key.public_key,
+            version=bakery.LATEST_VERSION,
+        ))
+        b = new_bakery('loc', locator, None)
+        m = b.oven.macaroon(
+            version=bakery.LATEST_VERSION, expiry=AGES,
+            caveats=[checkers.Caveat(location='http://1.2.3.4',
+                                     condition='is-ok')],
+            ops=[TEST_OP])
+        discharges = []
+
+        @urlmatch(path='.*/here')
+        def server_get(url, request):
+            # Reject the first discharge, even though it is valid, by
+            # sending the same macaroon again.
+            if len(discharges) < 2:
+                content, headers = httpbakery.discharge_required_response(
+                    m, '/', 'test', 'message')
+                resp = response(status_code=401, content=content,
+                                headers=headers)
+            else:
+                resp = response(status_code=200, content='done')
+            return request.hooks['response'][0](resp)
+
+        @urlmatch(path='.*/discharge')
+        def discharge(url, request):
+            qs = parse_qs(request.body)
+            content = {q: qs[q][0] for q in qs}
+            dm = httpbakery.discharge(checkers.AuthContext(), content, key,
+                                      locator, alwaysOK3rd)
+            discharges.append(dm)
+            return {
+                'status_code': 200,
+                'content': {
+                    'Macaroon': dm.to_dict()
+                }
+            }
+
+        client = httpbakery.Client()
+        with HTTMock(server_get), HTTMock(discharge):
+            resp = requests.get('http://0.1.2.3/here',
+                                cookies=client.cookies,
+                                auth=client.auth())
+        self.assertEqual(resp.content, b'done')
+        self.assertEqual(len(discharges), 2)
+
+    def test_handle_error_with_several_third_party_caveats(self):
+        key = bakery.generate_key()
+        locator = bakery.ThirdPartyStore()
+        for loc in ('http://1.2.3.4', 'http://5.6.7.8'):
+            locator.add_info(loc, bakery.ThirdPartyInfo(
+                public_key=key.public_key,
+                version=bakery.LATEST_VERSION,
+            ))
+        b = new_bakery('loc', locator, None)
+        m = b.oven.macaroon(
+            version=bakery.LATEST_VERSION, expiry=AGES,
+            caveats=[
+                checkers.Caveat(location='http://1.2.3.4',
+                                condition='is-ok'),
+                checkers.Caveat(location='http://5.6.7.8',
+                                condition='is-ok'),
+            ],
+            ops=[TEST_OP])
+        error = httpbakery.Error(
+            code=httpbakery.ERR_DISCHARGE_REQUIRED,
+            message='error',
+            version=bakery.LATEST_VERSION,
+            info=httpbakery.ErrorInfo(macaroon=m, macaroon_path='/'))
+
+        threads = []
+
+        @urlmatch(path='.*/discharge')
+        def discharge(url, request):
+            threads.append(threading.current_thread())
+            qs = parse_qs(request.body)
+            content = {q: qs[q][0] for q in qs}
+            dm = httpbakery.discharge(checkers.AuthContext(), content, key,
+                                      locator, alwaysOK3rd)
+            return {
+                'status_code': 200,
+                'content': {
+                    'Macaroon': dm.to_dict()
+                }
+            }
+
+        with ThreadPoolExecutor(2) as pool:
+            for executor in (None, pool):
+                del threads[:]
+                client = httpbakery.Client(discharge_executor=executor)
+                with HTTMock(discharge):
+                    client.handle_error(error, 'http://example.com/')
+                [cookie] = client.cookies
+                ms = httpbakery.extract_macaroons(
+                    {'Cookie': '{}={}'.format(cookie.name, cookie.value)})
+                self.assertEqual(len(ms), 1)
+                self.assertEqual(len(ms[0]), 3)
+                self.assertEqual(len(threads), 2)
+                if executor is None:
+                    # Without an executor, discharges are acquired
+                    # sequentially on the calling thread.
+                    self.assertEqual(set(threads),
+                                     {threading.current_thread()})
+
+    def test_interaction_required_reuses_concurrent_discharges(self):
+        key = bakery.generate_key()
+        locator = bakery.ThirdPartyStore()
+        for loc in ('http://1.2.3.4', 'http://5.6.7.8'):
+            locator.add_info(loc, bakery.ThirdPartyInfo(
+                public_key=key.public_key,
+                version=bakery.LATEST_VERSION,
+            ))
+        b = new_bakery('loc', locator, None)
+        m = b.oven.macaroon(
+            version=bakery.LATEST_VERSION, expiry=AGES,
+            caveats=[
+                checkers.Caveat(location='http://1.2.3.4',
+                                condition='is-ok'),
+                checkers.Caveat(location='http://5.6.7.8',
+                                condition='is-ok'),
+            ],
+            ops=[TEST_OP])
+        error = httpbakery.Error(
+            code=httpbakery.ERR_DISCHARGE_REQUIRED,
+            message='error',
+            version=bakery.LATEST_VERSION,
+            info=httpbakery.ErrorInfo(macaroon=m, macaroon_path='/'))
+        requested = []
+
+        @urlmatch(path='.*/discharge')
+        def discharge(url, request):
+            requested.append(url.netloc)
+            qs = parse_qs(request.body)
+            # Only the discharger at 5.6.7.8 requires interaction.
+            if url.netloc == '5.6.7.8' and 'token' not in qs:
+                return {
+                    'status_code': 401,
+                    'content': {
+                        'Code': httpbakery.ERR_INTERACTION_REQUIRED,
+                        'Message': 'interaction required',
+                        'Info': {
+                            'InteractionMethods': {'test': {}},
+                        },
+                    },
+                }
+            content = {q: qs[q][0] for q in qs}
+            dm = httpbakery.discharge(checkers.AuthContext(), content, key,
+                                      locator, alwaysOK3rd)
+            return {
+                'status_code': 200,
+                'content': {
+                    'Macaroon': dm.to_dict()
+                }
+            }
+
+        class TokenInteractor(httpbakery.Interactor):
+            def kind(self):
+                return 'test'
+
+            def interact(self, client, location, interaction_required_err):
+                return httpbakery.DischargeToken(kind='test', value=b'token')
+
+        with ThreadPoolExecutor(2) as executor:
+            client = httpbakery.Client(
+                interaction_methods=[TokenInteractor()],
+                discharge_executor=executor)
+            with HTTMock(discharge):
+                client.handle_error(error, 'http://example.com/')
+        [cookie] = client.cookies
+        ms = httpbakery.extract_macaroons(
+            {'Cookie': '{}={}'.format(cookie.name, cookie.value)})
+        self.assertEqual(len(ms[0]), 3)
+        # The discharge acquired before interaction was needed is not
+        # requested again.
+        self.assertEqual(requested.count('1.2.3.4'), 1)
+        self.assertEqual(requested.count('5.6.7.8'), 3)
+
 
 class GetHandler(BaseHTTPRequestHandler):
     '''A mock HTTP server that serves a GET request'''
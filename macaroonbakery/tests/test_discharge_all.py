@@ -1,6 +1,7 @@
 # Copyright 2017 Canonical Ltd.
 # Licensed under the LGPLv3, see LICENCE file for details.
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 import macaroonbakery.bakery as bakery
 import macaroonbakery.checkers as checkers
@@ -132,6 +133,36 @@ class TestDischargeAll(unittest.TestCase):
         v.satisfy_general(always_ok)
         v.verify(ms[0], root_key, ms[1:])
 
+    def test_discharge_all_with_executor(self):
+        root_key = b'root key'
+        m0 = bakery.Macaroon(
+            root_key=root_key, id=b'id0', location='loc0',
+            version=bakery.LATEST_VERSION)
+        for i in range(1, 6):
+            cid = 'id{}'.format(i)
+            m0.macaroon.add_third_party_caveat(
+                location='somewhere',
+                key='root key {}'.format(cid).encode('utf-8'),
+                key_id=cid.encode('utf-8'))
+
+        def get_discharge(cav, payload):
+            return bakery.Macaroon(
+                root_key='root key {}'.format(
+                    cav.caveat_id.decode('utf-8')).encode('utf-8'),
+                id=cav.caveat_id, location='',
+                version=bakery.LATEST_VERSION)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            ms = bakery.discharge_all(m0, get_discharge, executor=executor)
+
+        self.assertEqual(len(ms), 6)
+        self.assertEqual([m.identifier_bytes for m in ms[1:]],
+                         [b'id1', b'id2', b'id3', b'id4', b'id5'])
+
+        v = Verifier()
+        v.satisfy_general(always_ok)
+        v.verify(ms[0], root_key, ms[1:])
+
     def test_discharge_all_local_discharge(self):
         oc = common.new_bakery('ts', None)
         client_key = bakery.generate_key()
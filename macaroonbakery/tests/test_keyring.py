@@ -32,6 +32,24 @@ class TestKeyRing(unittest.TestCase):
             info = kr.third_party_info('http://0.1.2.3/')
         self.assertEqual(info, expectInfo)
 
+    def test_context_manager(self):
+        key = bakery.generate_key()
+
+        @urlmatch(path='.*/discharge/info')
+        def discharge_info(url, request):
+            return {
+                'status_code': 200,
+                'content': {
+                    'Version': bakery.LATEST_VERSION,
+                    'PublicKey': str(key.public_key),
+                }
+            }
+
+        with httpbakery.ThirdPartyLocator(allow_insecure=True) as kr:
+            with HTTMock(discharge_info):
+                info = kr.third_party_info('http://0.1.2.3/')
+        self.assertEqual(info.public_key, key.public_key)
+
     def test_cache_norefetch(self):
         key = bakery.generate_key()
 
@@ -158,6 +158,11 @@ class TestMacaroon(TestCase):
         self.assertEqual('underlying macaroon has inconsistent version; '
                          'got 1 want 2', exc.exception.args[0])
 
+    def test_legacy_namespace_is_not_shared(self):
+        ns = bakery.legacy_namespace()
+        ns.register('testns', 'x')
+        self.assertEqual(str(bakery.legacy_namespace()), 'std:')
+
     def test_clone(self):
         locator = bakery.ThirdPartyStore()
         bs = common.new_bakery("bs-loc", locator)
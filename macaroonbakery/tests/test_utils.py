@@ -9,7 +9,7 @@ from unittest import TestCase
 
 import macaroonbakery.bakery as bakery
 import pymacaroons
-from macaroonbakery._utils import cookie
+from macaroonbakery._utils import cookie, json_loads, relative_url
 from pymacaroons.serializers import json_serializer
 
 
@@ -85,6 +85,29 @@ class TestB64Decode(TestCase):
                 self.assertEqual(bakery.b64decode(test['input']), test['expect'].encode('utf-8'), msg=test['about'])
 
 
+class JSONLoadsTest(TestCase):
+    def test_json_loads(self):
+        for data in ['{"a": [1, "b"]}', b'{"a": [1, "b"]}']:
+            self.assertEqual(json_loads(data), {'a': [1, 'b']})
+
+    def test_json_loads_invalid(self):
+        for data in ['}', b'bad system', b'\xff']:
+            with self.assertRaises(ValueError):
+                json_loads(data)
+
+
+class RelativeURLTest(TestCase):
+    def test_relative_url(self):
+        for base, new, expect in [
+            ('http://example.com', 'discharge', 'http://example.com/discharge'),
+            ('http://example.com/a', 'discharge', 'http://example.com/a/discharge'),
+            ('http://example.com/a/', 'discharge', 'http://example.com/a/discharge'),
+            ('http://example.com/a', '/login', 'http://example.com/login'),
+            ('http://example.com/a', 'http://other.com/x', 'http://other.com/x'),
+        ]:
+            self.assertEqual(relative_url(base, new), expect)
+
+
 class MacaroonToDictTest(TestCase):
     def test_macaroon_to_dict(self):
         m = pymacaroons.Macaroon(